@@ -3,19 +3,29 @@ Conversation Orchestration Server
 Manages ElevenLabs conversational AI sessions without handling audio directly
 """
 
+# Must run before any other import so sockets, threads and time are green
+# from the start; required for eventlet async mode under gunicorn
+import eventlet
+eventlet.monkey_patch()
+
 import os
+import time
 import uuid
 import hmac
 import hashlib
 import logging
+import threading
+from collections import deque
 from datetime import datetime
 from typing import Dict, Optional, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field, asdict
 from enum import Enum
 
-from flask import Flask, request, jsonify, send_from_directory, make_response
+from flask import Flask, request, send_from_directory, make_response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
+import orjson
+import redis
 import requests
 from dotenv import load_dotenv
 
@@ -24,6 +34,7 @@ from utils.conversation_stage import classify_conversation_stages
 
 # Import webhook processing utilities
 from utils.dataproc import (
+    decode_webhook,
     process_post_call_webhook,
     extract_transcript_data,
     extract_call_statistics,
@@ -41,6 +52,10 @@ class Config:
     SERVER_PORT = int(os.getenv('SERVER_PORT', 5000))
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     ELEVENLABS_API_URL = 'https://api.elevenlabs.io/v1'
+    REDIS_URL = os.getenv('REDIS_URL')
+    SESSION_TTL_SECS = int(os.getenv('SESSION_TTL_SECS', 86400))
+    # Pre-encoded once so the per-request HMAC doesn't re-encode the secret
+    WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode('utf-8')
 
 # Setup logging
 logging.basicConfig(
@@ -52,6 +67,9 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'development-secret-key')
+# When deployed behind a sendfile-capable proxy (nginx X-Accel-Redirect),
+# let the proxy stream static files instead of tying up a Python worker
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'false').lower() in ('1', 'true', 'yes')
 
 # ngrok wildcard requires regex=True
 CORS(app, 
@@ -63,7 +81,7 @@ CORS(app,
      send_wildcard=False,
      vary_header=True)
 
-socketio = SocketIO(app, cors_allowed_origins=[
+socketio = SocketIO(app, async_mode='eventlet', cors_allowed_origins=[
     "http://localhost:4200", 
     "https://*.ngrok-free.app",
     "https://zyter-trucare-da4d9.web.app"
@@ -80,6 +98,51 @@ def handle_preflight():
         response.headers.add("Access-Control-Allow-Credentials", "true")
         return response, 200
 
+def json_response(payload, status=200):
+    """JSON response serialized with orjson (3-5x faster than stdlib json)"""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+
+# Serialized responses for completed sessions: (session_id, endpoint) -> (body, etag)
+_completed_response_cache: Dict[tuple, tuple] = {}
+
+# Cap on each serialized-response cache so completed calls don't pin their
+# payload bytes in process memory forever; evicted entries are simply
+# re-serialized (or re-read from Redis) on the next request
+_RESPONSE_CACHE_MAX = 256
+
+def _cache_put(cache: Dict, key, value):
+    """Insert into a response cache, evicting the oldest entry when full
+    (dicts iterate in insertion order, so this is FIFO)"""
+    if len(cache) >= _RESPONSE_CACHE_MAX and key not in cache:
+        del cache[next(iter(cache))]
+    cache[key] = value
+
+def cacheable_json_response(session, endpoint: str, payload):
+    """JSON response with ETag/Cache-Control once a session is COMPLETED
+
+    A completed session's transcript and summary never change, so polling
+    clients get a 304 (or a long-lived cached body) instead of a fresh
+    serialization of the whole payload.
+    """
+    if session.status != ConversationStatus.COMPLETED:
+        return json_response(payload)
+
+    key = (session.session_id, endpoint)
+    cached = _completed_response_cache.get(key)
+    if cached is None:
+        body = orjson.dumps(payload)
+        cached = (body, hashlib.md5(body).hexdigest())
+        _cache_put(_completed_response_cache, key, cached)
+
+    body, etag = cached
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    return response
+
 
 # Data models
 class ConversationStatus(Enum):
@@ -88,33 +151,143 @@ class ConversationStatus(Enum):
     COMPLETED = "completed"
     ERROR = "error"
 
-@dataclass
+# slots=True drops the per-instance __dict__, shrinking each session and
+# speeding up attribute access when many sessions are held in memory
+@dataclass(slots=True)
 class ConversationSession:
     session_id: str
     agent_id: str
     conversation_id: Optional[str] = None
     status: ConversationStatus = ConversationStatus.INITIALIZING
-    created_at: datetime = None
-    updated_at: datetime = None
-    metadata: Dict[str, Any] = None
-    webhook_data: list = None
-    processed_data: Dict[str, Any] = None  # New field for processed webhook data
-    
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    # Unix timestamp kept alongside so hot-path recency checks are a float
+    # compare instead of datetime subtraction
+    created_at_ts: float = field(default_factory=time.time)
+    updated_at: Optional[datetime] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    # Bounded: raw payloads are only kept for debugging, and an unbounded
+    # list is a per-session memory leak on long calls
+    webhook_data: deque = field(default_factory=lambda: deque(maxlen=10))
+    processed_data: Dict[str, Any] = field(default_factory=dict)  # New field for processed webhook data
+
     def __post_init__(self):
-        if self.created_at is None:
-            self.created_at = datetime.utcnow()
         if self.updated_at is None:
             self.updated_at = self.created_at
-        if self.metadata is None:
-            self.metadata = {}
-        if self.webhook_data is None:
-            self.webhook_data = []
-        if self.processed_data is None:
-            self.processed_data = {}
-
-# Session storage (use Redis in production)
+
+# Session storage: in-process working set, written through to Redis when
+# REDIS_URL is set so sessions survive restarts and multi-worker deployments
 sessions: Dict[str, ConversationSession] = {}
 
+# In-process lookup indexes so webhook handling never scans every session.
+# The lock guards sessions and both indexes: concurrent webhook handling can
+# otherwise mutate the dicts mid-iteration. Reentrant so helpers that take
+# it can be called from locked sections.
+conv_index: Dict[str, str] = {}  # conversation_id -> session_id
+agent_index: Dict[str, list] = {}  # agent_id -> [session_id, ...]
+_sessions_lock = threading.RLock()
+
+# Pre-serialized staged-transcript responses keyed by session_id, written
+# once when classification finishes so polling GETs never re-serialize.
+# Bounded via _cache_put like the completed-response cache above.
+_staged_transcript_cache: Dict[str, bytes] = {}
+
+def index_conversation(conversation_id: str, session_id: str):
+    """Record the conversation_id -> session_id mapping"""
+    with _sessions_lock:
+        conv_index[conversation_id] = session_id
+
+redis_client = None
+if Config.REDIS_URL:
+    try:
+        redis_client = redis.Redis.from_url(Config.REDIS_URL, decode_responses=True)
+        redis_client.ping()
+        logger.info("Connected to Redis session store")
+    except redis.RedisError as e:
+        logger.warning(f"Redis unavailable, using in-process sessions only: {e}")
+        redis_client = None
+
+def _session_to_dict(session: ConversationSession) -> Dict[str, Any]:
+    """Convert a session to a JSON-serializable dict"""
+    data = asdict(session)
+    data['status'] = session.status.value
+    data['webhook_data'] = list(session.webhook_data)
+    return data
+
+def _session_from_dict(data: Dict[str, Any]) -> ConversationSession:
+    """Rebuild a session from its stored dict form"""
+    return ConversationSession(
+        session_id=data['session_id'],
+        agent_id=data['agent_id'],
+        conversation_id=data.get('conversation_id'),
+        status=ConversationStatus(data.get('status', 'initializing')),
+        created_at=datetime.fromisoformat(data['created_at']),
+        created_at_ts=data.get('created_at_ts') or time.time(),
+        updated_at=datetime.fromisoformat(data['updated_at']),
+        metadata=data.get('metadata') or {},
+        webhook_data=deque(data.get('webhook_data') or [], maxlen=10),
+        processed_data=data.get('processed_data') or {}
+    )
+
+def persist_session(session: ConversationSession):
+    """Write a session through to Redis, keeping the secondary indexes in sync"""
+    if not redis_client:
+        return
+    try:
+        payload = orjson.dumps(_session_to_dict(session), default=str)
+        # Pipeline the writes so persisting costs one round-trip, not three;
+        # this handler runs on every websocket event during reconnect storms
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(f"sess:{session.session_id}", Config.SESSION_TTL_SECS, payload)
+        # Agent index: sorted set keyed by creation time so the webhook
+        # fallback can grab the most recent session in one command
+        pipe.zadd(f"agent:{session.agent_id}", {session.session_id: session.created_at.timestamp()})
+        if session.conversation_id:
+            pipe.setex(f"conv:{session.conversation_id}", Config.SESSION_TTL_SECS, session.session_id)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Failed to persist session {session.session_id}: {e}")
+
+def load_session(session_id: Optional[str]) -> Optional[ConversationSession]:
+    """Fetch a session, rehydrating from Redis if it isn't in this process"""
+    if not session_id:
+        return None
+    session = sessions.get(session_id)
+    if session or not redis_client:
+        return session
+    try:
+        raw = redis_client.get(f"sess:{session_id}")
+    except redis.RedisError as e:
+        logger.error(f"Failed to load session {session_id}: {e}")
+        return None
+    if not raw:
+        return None
+    session = _session_from_dict(orjson.loads(raw))
+    with _sessions_lock:
+        sessions[session_id] = session
+    return session
+
+def find_session_by_conversation(conversation_id: Optional[str]) -> Optional[ConversationSession]:
+    """O(1) conversation_id -> session lookup via the Redis index"""
+    if not conversation_id or not redis_client:
+        return None
+    try:
+        session_id = redis_client.get(f"conv:{conversation_id}")
+    except redis.RedisError as e:
+        logger.error(f"Failed to look up conversation {conversation_id}: {e}")
+        return None
+    return load_session(session_id)
+
+def find_latest_session_for_agent(agent_id: str) -> Optional[ConversationSession]:
+    """Most recently created session for an agent via the Redis sorted set"""
+    if not redis_client:
+        return None
+    try:
+        session_ids = redis_client.zrevrange(f"agent:{agent_id}", 0, 0)
+    except redis.RedisError as e:
+        logger.error(f"Failed to look up agent {agent_id}: {e}")
+        return None
+    return load_session(session_ids[0]) if session_ids else None
+
 # Agent configuration storage
 agent_configs = {
     "clara": {
@@ -143,29 +316,51 @@ agent_configs = {
 def verify_webhook_signature(request_obj) -> bool:
     """Verify webhook signature from ElevenLabs"""
     try:
-        signature = request_obj.headers.get('elevenlabs-signature')
-        if not signature:
+        signature_header = request_obj.headers.get('elevenlabs-signature')
+        if not signature_header:
             logger.warning("Missing webhook signature")
             return False
-        
-        # Get raw payload as bytes
-        payload = request_obj.get_data()
 
-        # Compute HMAC SHA256 using your secret
-        expected_signature = hmac.new(
-            Config.WEBHOOK_SECRET.encode('utf-8'),
-            payload,
-            hashlib.sha256
-        ).hexdigest()
+        # Header format: t=<unix seconds>,v0=<hex hmac of "timestamp.body">
+        try:
+            parts = dict(part.split('=', 1) for part in signature_header.split(','))
+            timestamp = parts['t']
+            signature = parts['v0']
+        except (ValueError, KeyError):
+            logger.warning("Malformed webhook signature header")
+            return False
+
+        # Reject replayed payloads before doing any HMAC work
+        if abs(time.time() - int(timestamp)) > 300:
+            logger.warning("Webhook signature timestamp outside allowed window")
+            return False
+
+        # Get raw payload as bytes (cached so request.json doesn't re-read it)
+        payload = request_obj.get_data(cache=True)
+
+        # Decode the provided hex signature to raw bytes up front; comparing
+        # 32-byte digests is half the work of comparing 64-char hex strings
+        try:
+            provided_signature = bytes.fromhex(signature)
+        except ValueError:
+            logger.warning("Malformed webhook signature header")
+            return False
+
+        # Compute HMAC SHA256 using your secret; the one-shot hmac.digest
+        # skips the Python-level HMAC object construction entirely
+        expected_signature = hmac.digest(
+            Config.WEBHOOK_SECRET_BYTES,
+            f"{timestamp}.".encode('utf-8') + payload,
+            'sha256'
+        )
 
         # Use constant-time comparison
-        if not hmac.compare_digest(signature, expected_signature):
+        if not hmac.compare_digest(expected_signature, provided_signature):
             logger.warning("Invalid webhook signature")
-            return True
-            # return False
-        
+            return False
+
         return True
-    
+
     except Exception as e:
         logger.error(f"Error verifying webhook signature: {e}")
         return False
@@ -174,16 +369,16 @@ def verify_webhook_signature(request_obj) -> bool:
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'sessions_active': len([s for s in sessions.values() if s.status == ConversationStatus.ACTIVE])
+        'sessions_active': len([s for s in list(sessions.values()) if s.status == ConversationStatus.ACTIVE])
     })
 
 @app.route('/api/agents', methods=['GET'])
 def get_agents():
     """Get available agents"""
-    return jsonify({
+    return json_response({
         'agents': [
             {
                 'key': key,
@@ -198,11 +393,14 @@ def get_agents():
 @app.route('/api/sessions', methods=['POST'])
 def create_session():
     """Create a new conversation session"""
-    data = request.json
+    try:
+        data = orjson.loads(request.get_data(cache=True))
+    except orjson.JSONDecodeError:
+        return json_response({'error': 'Invalid JSON body'}), 400
     agent_key = data.get('agent_key')
     
     if agent_key not in agent_configs:
-        return jsonify({'error': 'Invalid agent key'}), 400
+        return json_response({'error': 'Invalid agent key'}), 400
     
     session_id = str(uuid.uuid4())
     agent_config = agent_configs[agent_key]
@@ -217,11 +415,14 @@ def create_session():
         }
     )
     
-    sessions[session_id] = session
-    
+    with _sessions_lock:
+        sessions[session_id] = session
+        agent_index.setdefault(session.agent_id, []).append(session_id)
+    persist_session(session)
+
     logger.info(f"Created session {session_id} for agent {agent_key}")
     
-    return jsonify({
+    return json_response({
         'session_id': session_id,
         'agent': {
             'name': agent_config['name'],
@@ -234,11 +435,11 @@ def create_session():
 @app.route('/api/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
     """Get session details"""
-    session = sessions.get(session_id)
+    session = load_session(session_id)
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
+        return json_response({'error': 'Session not found'}), 404
     
-    return jsonify({
+    return json_response({
         'session_id': session.session_id,
         'status': session.status.value,
         'agent_id': session.agent_id,
@@ -253,27 +454,23 @@ def get_session(session_id):
 @app.route('/api/sessions/<session_id>/transcript', methods=['GET'])
 def get_transcript(session_id):
     """Get conversation transcript"""
-    session = sessions.get(session_id)
+    session = load_session(session_id)
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
+        return json_response({'error': 'Session not found'}), 404
     
     # Check if we have processed transcript data
     if session.processed_data and 'transcript' in session.processed_data:
-        return jsonify({
+        return cacheable_json_response(session, 'transcript', {
             'session_id': session_id,
             'transcript': session.processed_data['transcript'].get('transcript', []),
             'message_count': session.processed_data['transcript'].get('message_count', 0)
         })
-    
-    # Fallback to raw webhook data
-    transcript = []
-    for webhook in session.webhook_data:
-        if webhook.get('type') == 'conversation.update':
-            data = webhook.get('data', {})
-            if 'transcript' in data:
-                transcript.extend(data['transcript'])
-    
-    return jsonify({
+
+    # Fallback to the live transcript accumulated from conversation.update
+    # webhooks (precomputed, so this GET is O(1) instead of a re-aggregation)
+    transcript = session.processed_data.get('live_transcript', [])
+
+    return cacheable_json_response(session, 'transcript', {
         'session_id': session_id,
         'transcript': transcript,
         'message_count': len(transcript)
@@ -282,78 +479,134 @@ def get_transcript(session_id):
 @app.route('/api/sessions/<session_id>/staged-transcript', methods=['GET'])
 def get_staged_transcript(session_id):
     """Get staged conversation transcript"""
-    session = sessions.get(session_id)
+    # Serve the pre-serialized bytes when classification has already run
+    cached = _staged_transcript_cache.get(session_id)
+    if cached is not None:
+        return app.response_class(cached, mimetype='application/json')
+
+    session = load_session(session_id)
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
-    
+        return json_response({'error': 'Session not found'}), 404
+
     if session.processed_data and 'classified_transcript' in session.processed_data:
-        return jsonify({
+        # Session was classified elsewhere (e.g. another worker); serialize
+        # once and cache the bytes for subsequent polls
+        payload = orjson.dumps({
             'session_id': session_id,
-            'transcript': session.processed_data['classified_transcript'].get('transcript',[]),
+            'transcript': session.processed_data['classified_transcript'].get('transcript', []),
             'message_count': session.processed_data['classified_transcript'].get('message_count', 0)
         })
-    
+        _cache_put(_staged_transcript_cache, session_id, payload)
+        return app.response_class(payload, mimetype='application/json')
+
     classified_transcript = []
-    return jsonify({
+    return json_response({
         'session_id': session_id,
         'transcript': classified_transcript,
         'message_count': len(classified_transcript)
     })
 
+def classify_and_emit(session_id: str, transcript_data: Dict[str, Any]):
+    """Background task: classify conversation stages and notify the room"""
+    session = load_session(session_id)
+    if not session:
+        return
+
+    try:
+        classified_transcript = classify_conversation_stages(transcript_data)
+    except Exception as e:
+        logger.error(f"Error auto-classifying stages: {str(e)}")
+        return
+
+    session.processed_data['classified_transcript'] = classified_transcript
+    _cache_put(_staged_transcript_cache, session_id, orjson.dumps({
+        'session_id': session_id,
+        'transcript': classified_transcript.get('transcript', []),
+        'message_count': classified_transcript.get('message_count', 0)
+    }))
+    persist_session(session)
+
+    socketio.emit('webhook_update', {
+        'type': 'transcript_classified',
+        'session_id': session_id,
+        'message_count': classified_transcript.get('message_count', 0)
+    }, room=session_id)
+
+    logger.info(f"Auto-classified conversation stages for session {session_id}")
+
 # Webhook endpoint
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Handle ElevenLabs webhooks"""
     if not verify_webhook_signature(request):
         logger.warning("Invalid webhook signature")
-        return jsonify({'error': 'Invalid signature'}), 401
+        return json_response({'error': 'Invalid signature'}), 401
     
     try:
-        webhook_data = request.json
+        # Raw body is already cached by signature verification; the shared
+        # decoder keeps the ingress and dataproc extractors on one parser
+        webhook_data = decode_webhook(request.get_data(cache=True))
         webhook_type = webhook_data.get('type')
-        conversation_id = webhook_data.get('data', {}).get('conversation_id')
+        # Resolve the data subtree once; the handler reads it in several places
+        data = webhook_data.get('data', {})
+        conversation_id = data.get('conversation_id')
+        # One timestamp per webhook; reused for storage, updated_at and the
+        # recency filter instead of repeated datetime.utcnow() calls
+        now = datetime.utcnow()
+        now_ts = time.time()
         
         logger.info(f"Received webhook: {webhook_type} for conversation {conversation_id}")
         
-        # Find session by conversation_id
-        session = None
-        for sess in sessions.values():
-            if sess.conversation_id == conversation_id:
-                session = sess
-                break
+        # Find session by conversation_id: O(1) in-process index first,
+        # then the Redis index (covers sessions linked by another worker)
+        with _sessions_lock:
+            indexed_session_id = conv_index.get(conversation_id)
+        session = load_session(indexed_session_id) or find_session_by_conversation(conversation_id)
         
         # ENHANCED FALLBACK: If no session found, try to match by agent_id
         if not session and webhook_type == 'post_call_transcription':
-            agent_id = webhook_data.get('data', {}).get('agent_id')
+            agent_id = data.get('agent_id')
             if agent_id:
                 logger.warning(f"No session found for conversation {conversation_id}, attempting fallback match by agent_id {agent_id}")
                 
-                # Debug: Log all sessions
+                # Debug: Log all sessions (snapshot the dict so concurrent
+                # inserts can't change its size mid-iteration)
                 logger.info("Current sessions:")
-                for sess_id, sess in sessions.items():
+                for sess_id, sess in list(sessions.items()):
                     logger.info(f"  - Session {sess_id}: agent_id={sess.agent_id}, status={sess.status.value}, created={sess.created_at}")
                 
                 # Find most recent active/initializing session for this agent
+                with _sessions_lock:
+                    candidate_ids = list(agent_index.get(agent_id, []))
                 matching_sessions = [
-                    sess for sess in sessions.values() 
-                    if sess.agent_id == agent_id and sess.status in [ConversationStatus.ACTIVE, ConversationStatus.INITIALIZING]
+                    sessions[sid] for sid in candidate_ids
+                    if sid in sessions and sessions[sid].status in [ConversationStatus.ACTIVE, ConversationStatus.INITIALIZING]
                 ]
-                
+
                 if matching_sessions:
                     # Use the most recent session
                     session = max(matching_sessions, key=lambda s: s.created_at)
-                    
+                else:
+                    # Most recent session for this agent from the Redis index
+                    # (covers sessions created by another worker)
+                    candidate = find_latest_session_for_agent(agent_id)
+                    if candidate and candidate.status in [ConversationStatus.ACTIVE, ConversationStatus.INITIALIZING]:
+                        session = candidate
+
+                if session:
                     # Link the conversation_id to this session
                     session.conversation_id = conversation_id
                     session.status = ConversationStatus.ACTIVE
-                    
+                    index_conversation(conversation_id, session.session_id)
+                    persist_session(session)
+
                     logger.info(f"FALLBACK SUCCESS: Linked conversation {conversation_id} to session {session.session_id} based on agent_id {agent_id}")
                 else:
                     # Try ANY recent session if exact agent match fails
                     recent_sessions = [
-                        sess for sess in sessions.values() 
+                        sess for sess in list(sessions.values())
                         if sess.status in [ConversationStatus.ACTIVE, ConversationStatus.INITIALIZING]
-                        and (datetime.utcnow() - sess.created_at).total_seconds() < 300  # Within last 5 minutes
+                        and now_ts - sess.created_at_ts < 300  # Within last 5 minutes
                     ]
                     
                     if recent_sessions:
@@ -363,6 +616,8 @@ def webhook():
                         # Link the conversation_id to this session
                         session.conversation_id = conversation_id
                         session.status = ConversationStatus.ACTIVE
+                        index_conversation(conversation_id, session.session_id)
+                        persist_session(session)
                     else:
                         logger.error(f"FALLBACK FAILED: No active sessions found for agent_id {agent_id}")
         
@@ -370,11 +625,18 @@ def webhook():
             # Store raw webhook data
             session.webhook_data.append({
                 'type': webhook_type,
-                'timestamp': datetime.utcnow().isoformat(),
-                'data': webhook_data.get('data', {})
+                'timestamp': now.isoformat(),
+                'data': data
             })
-            session.updated_at = datetime.utcnow()
-            
+            session.updated_at = now
+
+            # Accumulate the live transcript as updates arrive so the
+            # transcript endpoint never has to re-aggregate raw webhooks
+            if webhook_type == 'conversation.update':
+                update_transcript = data.get('transcript')
+                if update_transcript:
+                    session.processed_data.setdefault('live_transcript', []).extend(update_transcript)
+
             # Process post-call transcription webhook
             if webhook_type == 'post_call_transcription':
                 try:
@@ -384,14 +646,12 @@ def webhook():
                     # Store processed data in session
                     session.processed_data = processed_data
                     
-                    # Classify conversation stages
+                    # Classify conversation stages in the background so the
+                    # 200 OK isn't held behind an OpenAI round-trip (which
+                    # would risk ElevenLabs webhook retries)
                     if 'transcript' in processed_data:
-                        try:
-                            classified_transcript = classify_conversation_stages(processed_data['transcript'])
-                            session.processed_data['classified_transcript'] = classified_transcript
-                            logger.info(f"Auto-classified conversation stages for session {session.session_id}")
-                        except Exception as e:
-                            logger.error(f"Error auto-classifying stages: {str(e)}")
+                        socketio.start_background_task(
+                            classify_and_emit, session.session_id, processed_data['transcript'])
                     
                     # Log key information
                     logger.info(f"Processed post-call data for session {session.session_id}:")
@@ -420,40 +680,44 @@ def webhook():
             emit_data = {
                 'type': webhook_type,
                 'session_id': session.session_id,
-                'data': webhook_data.get('data', {})
+                'data': data
             }
             
             # Add processed data summary for post-call transcription
             if webhook_type == 'post_call_transcription' and session.processed_data:
+                transcript = session.processed_data.get('transcript', {})
+                statistics = session.processed_data.get('statistics', {})
+                summary = session.processed_data.get('analysis', {}).get('summary', '')
                 emit_data['summary'] = {
-                    'message_count': session.processed_data.get('transcript', {}).get('message_count', 0),
-                    'call_duration': session.processed_data.get('statistics', {}).get('call_duration_formatted', 'N/A'),
-                    'total_cost': session.processed_data.get('statistics', {}).get('costs', {}).get('total_cost_dollars', 0),
-                    'call_summary': session.processed_data.get('analysis', {}).get('summary', '')[:200] + '...' if len(session.processed_data.get('analysis', {}).get('summary', '')) > 200 else session.processed_data.get('analysis', {}).get('summary', '')
+                    'message_count': transcript.get('message_count', 0),
+                    'call_duration': statistics.get('call_duration_formatted', 'N/A'),
+                    'total_cost': statistics.get('costs', {}).get('total_cost_dollars', 0),
+                    'call_summary': summary[:200] + '...' if len(summary) > 200 else summary
                 }
             
             socketio.emit('webhook_update', emit_data, room=session.session_id)
-            
+
+            persist_session(session)
             logger.info(f"Processed webhook for session {session.session_id}")
         else:
             logger.warning(f"No session found for conversation {conversation_id}")
         
-        return jsonify({'status': 'processed'})
+        return json_response({'status': 'processed'})
         
     except Exception as e:
         logger.error(f"Webhook processing error: {str(e)}")
-        return jsonify({'error': 'Processing failed'}), 500
+        return json_response({'error': 'Processing failed'}), 500
 
 # New endpoint to get processed call data
 @app.route('/api/sessions/<session_id>/call-summary', methods=['GET'])
 def get_call_summary(session_id):
     """Get processed call summary data"""
-    session = sessions.get(session_id)
+    session = load_session(session_id)
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
+        return json_response({'error': 'Session not found'}), 404
     
     if not session.processed_data:
-        return jsonify({'error': 'No processed data available yet'}), 404
+        return json_response({'error': 'No processed data available yet'}), 404
     
     # Return a clean summary
     summary = {
@@ -482,8 +746,8 @@ def get_call_summary(session_id):
     # Add patient info if available
     if 'analysis' in session.processed_data and 'collected_data' in session.processed_data['analysis']:
         summary['patient_info'] = extract_key_patient_info(session.processed_data['analysis']['collected_data'])
-    
-    return jsonify(summary)
+
+    return cacheable_json_response(session, 'call-summary', summary)
 
 # WebSocket events
 @socketio.on('connect')
@@ -501,14 +765,19 @@ def handle_disconnect():
 def handle_join_session(data):
     """Join a conversation session room"""
     session_id = data.get('session_id')
-    session = sessions.get(session_id)
-    
+    if not session_id:
+        # Reject before touching the session store at all
+        emit('error', {'message': 'Invalid session'})
+        return
+
+    session = load_session(session_id)
     if not session:
         emit('error', {'message': 'Invalid session'})
         return
-    
+
     join_room(session_id)
     session.status = ConversationStatus.ACTIVE
+    persist_session(session)
     
     emit('session_joined', {
         'session_id': session_id,
@@ -532,12 +801,14 @@ def handle_conversation_started(data):
     session_id = data.get('session_id')
     conversation_id = data.get('conversation_id')
     
-    session = sessions.get(session_id)
+    session = load_session(session_id)
     if session:
         session.conversation_id = conversation_id
         session.status = ConversationStatus.ACTIVE
         session.updated_at = datetime.utcnow()
-        
+        index_conversation(conversation_id, session_id)
+        persist_session(session)
+
         logger.info(f"Conversation {conversation_id} started for session {session_id}")
         
         # Notify other clients in the room
@@ -551,12 +822,14 @@ def handle_conversation_started(data):
 @app.route('/')
 def serve_client():
     """Serve the HTML client"""
-    return send_from_directory('.', 'client.html')
+    # max_age lets browsers/proxies revalidate with a cheap 304 instead of
+    # re-streaming the page through Flask on every load
+    return send_from_directory('.', 'client.html', max_age=300)
 
 @app.route('/api/config')
 def get_client_config():
     """Get client configuration"""
-    return jsonify({
+    return json_response({
         'elevenlabs_api_key': Config.ELEVENLABS_API_KEY,
         'websocket_url': f"ws://localhost:{Config.SERVER_PORT}"
     })
@@ -564,16 +837,16 @@ def get_client_config():
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({'error': 'Not found'}), 404
+    return json_response({'error': 'Not found'}), 404
 
 @app.errorhandler(500)
 def internal_error(error):
     logger.error(f"Internal server error: {str(error)}")
-    return jsonify({'error': 'Internal server error'}), 500
+    return json_response({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
     logger.info(f"Starting orchestration server on port {Config.SERVER_PORT}")
     logger.info("Webhook URL: http://localhost:5000/webhook")
     logger.info("Client URL: http://localhost:5000")
     
-    socketio.run(app, host='0.0.0.0', port=Config.SERVER_PORT, debug=True)
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=Config.SERVER_PORT, debug=False)
\ No newline at end of file
@@ -1,8 +1,17 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from openai import OpenAI
 from pydantic import BaseModel
 from typing import List, Literal, Optional
 
+# Transcripts are classified in chunks fired concurrently: per-message
+# classification doesn't need the whole call as context, and N parallel
+# small prompts finish several times faster than one huge one
+CHUNK_SIZE = 30
+MAX_WORKERS = 8
+
 # Define the conversation stages as a literal type
 ConversationStage = Literal[
     "Greeting & Identification",
@@ -30,24 +39,35 @@ class ClassifiedTranscript(BaseModel):
     session_id: str
     transcript: List[ClassifiedMessage]
 
-def classify_conversation_stages(transcript_data: dict) -> dict:
+# Structure returned for a single chunk of the transcript
+class ClassifiedChunk(BaseModel):
+    transcript: List[ClassifiedMessage]
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """Build the OpenAI client once so its connection pool is reused across calls"""
+    return OpenAI()
+
+def _classify_chunk(messages: List[dict], offset: int) -> List[dict]:
     """
-    Classify each message in the transcript by conversation stage using OpenAI's structured output.
+    Classify one chunk of transcript messages; offset keeps the numbering
+    consistent with the full transcript.
     """
-    client = OpenAI()  # Make sure to set your OPENAI_API_KEY environment variable
-    
-    # Convert the transcript to a readable format for the AI
-    messages_text = ""
-    for i, msg in enumerate(transcript_data["transcript"]):
-        role = "Agent" if msg["role"] == "agent" else "User"
-        messages_text += f"{i+1}. {role}: {msg['message']}\n"
-    
+    client = get_openai_client()  # Make sure to set your OPENAI_API_KEY environment variable
+
+    # Convert the chunk to a readable format for the AI.
+    # Joining once avoids the quadratic cost of repeated string concatenation.
+    messages_text = "\n".join(
+        f"{offset+i+1}. {'Agent' if msg['role'] == 'agent' else 'User'}: {msg['message']}"
+        for i, msg in enumerate(messages)
+    )
+
     # Create the prompt
     prompt = f"""
     You are analyzing a medical authorization call transcript. Please classify each message according to these conversation stages:
 
     1. Greeting & Identification - Initial hello, introductions, identifying who is speaking
-    2. Recipient Verification - Confirming the correct patient/recipient 
+    2. Recipient Verification - Confirming the correct patient/recipient
     3. Purpose of Call - Explaining why the call is being made
     4. Clinical Summary - Medical details, diagnoses, conditions
     5. Authorization Details - Specific authorization numbers, services, approvals
@@ -55,12 +75,12 @@ def classify_conversation_stages(transcript_data: dict) -> dict:
     7. Contact Confirmation - Verifying phone numbers, contact information
     8. Closing - Ending the call, goodbyes
 
-    Here is the transcript:
+    Here is an excerpt of the transcript:
     {messages_text}
 
     Please classify each message with the most appropriate conversation stage.
     """
-    
+
     # Make the API call with structured output
     response = client.beta.chat.completions.parse(
         model="gpt-4o-mini",  # Use gpt-4o or gpt-4o-mini for structured outputs
@@ -68,9 +88,33 @@ def classify_conversation_stages(transcript_data: dict) -> dict:
             {"role": "system", "content": "You are a medical call transcript analyzer. Classify each message by conversation stage."},
             {"role": "user", "content": prompt}
         ],
-        response_format=ClassifiedTranscript
+        response_format=ClassifiedChunk
     )
-    
-    # Return the classified transcript
-    return response.choices[0].message.parsed.model_dump()
+
+    return [message.model_dump() for message in response.choices[0].message.parsed.transcript]
+
+def classify_conversation_stages(transcript_data: dict) -> dict:
+    """
+    Classify each message in the transcript by conversation stage using OpenAI's structured output.
+
+    Long transcripts are split into chunks classified concurrently, so the
+    wall-clock time scales with chunk size rather than call length.
+    """
+    messages = transcript_data["transcript"]
+    offsets = range(0, len(messages), CHUNK_SIZE)
+    chunks = [messages[offset:offset + CHUNK_SIZE] for offset in offsets]
+
+    if len(chunks) <= 1:
+        classified = _classify_chunk(messages, 0)
+    else:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = executor.map(_classify_chunk, chunks, offsets)
+        classified = [message for chunk in results for message in chunk]
+
+    # Same shape as ClassifiedTranscript
+    return {
+        'message_count': len(classified),
+        'session_id': transcript_data.get('conversation_id', ''),
+        'transcript': classified
+    }
 
@@ -1,43 +1,119 @@
 """
 Webhook Data Processing Utilities
 Extracts and formats data from ElevenLabs webhook payloads
+
+Extractor results are deliberately plain dicts: every consumer (session
+storage, Redis persistence, the orjson-serialized API endpoints) is
+dict-shaped, so typed containers (msgspec.Struct / slotted dataclasses)
+would be converted straight back to builtins at the module boundary and
+cost more than they save. The fast-serialization win those libraries
+advertise is already captured by encoding with orjson at the HTTP and
+Redis boundaries.
 """
 
+import os
+import orjson
+from collections import defaultdict
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
-def extract_transcript_data(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+# Shared default strings and the generation-type pair, hoisted so every
+# call reuses the same objects instead of re-materializing literals
+_UNKNOWN = 'unknown'
+_UNKNOWN_T = 'Unknown'
+_NONE = 'None'
+_GEN_TYPES = ('irreversible_generation', 'initiated_generation')
+
+# Raw payload echoes double the memory of every processed webhook and keep
+# the nested source dict alive downstream, so they are opt-in (DATAPROC_DEBUG=1
+# or an explicit include_raw=True)
+_INCLUDE_RAW_DEFAULT = os.getenv('DATAPROC_DEBUG') == '1'
+
+# Shared empty dict reused as a lookup default instead of allocating {} per call
+_EMPTY: Dict[str, Any] = {}
+
+# Reciprocal of ElevenLabs' credits-per-dollar rate (100000); multiplying by
+# this is cheaper than division and exact for the 4-decimal rounding we do
+_INV_CREDITS_PER_DOLLAR = 1e-5
+
+# Local binding skips the module attribute lookup on each call
+_now = datetime.now
+
+@lru_cache(maxsize=1024)
+def _iso_from_unix(ts: int) -> str:
+    """ISO-8601 string for a unix timestamp; datetime construction plus
+    isoformat is heavy enough to be worth caching across webhook retries
+    and reprocessing of the same call"""
+    return datetime.fromtimestamp(ts).isoformat()
+
+def format_transcript(transcript_raw: List[Dict[str, Any]]) -> tuple:
+    """
+    Build the formatted entry list and the display text in a single pass
+
+    Returns:
+        Tuple of (formatted transcript list, pre-joined transcript text)
+    """
+    formatted_transcript = []
+    lines = []
+    for entry in transcript_raw:
+        # Check the message first so null/empty rows never pay for the
+        # remaining field lookups or the formatted dict allocation
+        message = entry.get('message')
+        if not message:
+            continue
+        # One bound .get local for the remaining fields; cheaper than
+        # resolving entry.get per lookup, and with no per-row dict merge
+        eget = entry.get
+        role = eget('role', _UNKNOWN)
+        seconds = eget('time_in_call_secs', 0)
+        formatted_transcript.append({
+            'role': role,
+            'message': message,
+            'time_in_call_secs': seconds,
+            'interrupted': eget('interrupted', False),
+            'source_medium': eget('source_medium', _UNKNOWN)
+        })
+        # Inline the sub-hour formats (the overwhelmingly common cases) to
+        # skip a function call per row
+        if seconds < 60:
+            time_label = f"{seconds} seconds"
+        elif seconds < 3600:
+            time_label = f"{seconds // 60}m {seconds % 60}s"
+        else:
+            # Coerced to int so the cache key is stable across int/float inputs
+            time_label = format_duration(int(seconds))
+        lines.append(f"[{time_label}] {role.upper()}: {message}")
+
+    return formatted_transcript, "\n\n".join(lines)
+
+def extract_transcript_data(webhook_data: Dict[str, Any], include_raw: Optional[bool] = None) -> Dict[str, Any]:
     """
     Extract and format transcript data from webhook
-    
+
     Returns:
         Dict containing formatted transcript with metadata
     """
-    data = webhook_data.get('data', {})
+    return _extract_transcript(webhook_data.get('data') or _EMPTY, include_raw)
+
+def _extract_transcript(data: Dict[str, Any], include_raw: Optional[bool] = None) -> Dict[str, Any]:
+    """Transcript extraction over the already-resolved 'data' dict"""
     transcript_raw = data.get('transcript', [])
-    
-    # Format transcript for display
-    formatted_transcript = []
-    for entry in transcript_raw:
-        formatted_entry = {
-            'role': entry.get('role', 'unknown'),
-            'message': entry.get('message', ''),
-            'time_in_call_secs': entry.get('time_in_call_secs', 0),
-            'interrupted': entry.get('interrupted', False),
-            'source_medium': entry.get('source_medium', 'unknown')
-        }
-        
-        # Only include non-null messages
-        if formatted_entry['message']:
-            formatted_transcript.append(formatted_entry)
-    
-    return {
+
+    # One pass produces both the structured list and the display text, so
+    # callers never re-iterate the transcript just to render it
+    formatted_transcript, transcript_text = format_transcript(transcript_raw)
+
+    result = {
         'conversation_id': data.get('conversation_id'),
         'agent_id': data.get('agent_id'),
         'transcript': formatted_transcript,
         'message_count': len(formatted_transcript),
-        'raw_transcript': transcript_raw  # Include raw data for debugging
+        'text': transcript_text
     }
+    if include_raw or (include_raw is None and _INCLUDE_RAW_DEFAULT):
+        result['raw_transcript'] = transcript_raw  # Include raw data for debugging
+    return result
 
 def extract_call_statistics(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -46,53 +122,72 @@ def extract_call_statistics(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         Dict containing call metrics and statistics
     """
-    data = webhook_data.get('data', {})
+    return _extract_statistics(webhook_data.get('data') or _EMPTY)
+
+def _extract_statistics(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Statistics extraction over the already-resolved 'data' dict"""
     metadata = data.get('metadata', {})
     charging = metadata.get('charging', {})
-    
+
+    # Bind the bound methods and twice-used fields to locals; this function
+    # otherwise re-resolves metadata.get/charging.get a dozen times per call
+    mget = metadata.get
+    cget = charging.get
+    call_charge_credits = cget('call_charge', 0)
+    llm_charge_credits = cget('llm_charge', 0)
+    cost_credits = mget('cost', 0)
+    duration_secs = mget('call_duration_secs', 0)
+
     # Calculate costs in dollars (from credits)
-    call_cost_dollars = charging.get('call_charge', 0) / 100000  # Convert from credits
-    llm_cost_dollars = charging.get('llm_charge', 0) / 100000
-    total_cost_dollars = metadata.get('cost', 0) / 100000
-    
-    # Extract LLM usage details
-    llm_usage = charging.get('llm_usage', {})
-    llm_details = {}
-    
-    for generation_type in ['irreversible_generation', 'initiated_generation']:
-        if generation_type in llm_usage:
-            models = llm_usage[generation_type].get('model_usage', {})
-            for model_name, usage in models.items():
-                if model_name not in llm_details:
-                    llm_details[model_name] = {
-                        'total_input_tokens': 0,
-                        'total_output_tokens': 0,
-                        'total_cost': 0
-                    }
-                
-                input_data = usage.get('input', {})
-                output_data = usage.get('output_total', {})
-                
-                llm_details[model_name]['total_input_tokens'] += input_data.get('tokens', 0)
-                llm_details[model_name]['total_output_tokens'] += output_data.get('tokens', 0)
-                llm_details[model_name]['total_cost'] += input_data.get('price', 0) + output_data.get('price', 0)
+    call_cost_dollars = call_charge_credits * _INV_CREDITS_PER_DOLLAR
+    llm_cost_dollars = llm_charge_credits * _INV_CREDITS_PER_DOLLAR
+    total_cost_dollars = cost_credits * _INV_CREDITS_PER_DOLLAR
+
+    start_time_unix = mget('start_time_unix_secs')
+
+    # Extract LLM usage details: accumulate per-model totals in a single pass
+    # into [input_tokens, output_tokens, cost] lists, so each update indexes
+    # the model key once instead of re-hashing it per metric
+    llm_usage = cget('llm_usage', {})
+    totals = defaultdict(lambda: [0, 0, 0.0])
+
+    for generation_type in _GEN_TYPES:
+        generation = llm_usage.get(generation_type)
+        if not generation:
+            continue
+        for model_name, usage in generation.get('model_usage', {}).items():
+            input_data = usage.get('input') or _EMPTY
+            output_data = usage.get('output_total') or _EMPTY
+            model_totals = totals[model_name]
+            model_totals[0] += input_data.get('tokens', 0)
+            model_totals[1] += output_data.get('tokens', 0)
+            model_totals[2] += input_data.get('price', 0) + output_data.get('price', 0)
+
+    llm_details = {
+        model_name: {
+            'total_input_tokens': model_totals[0],
+            'total_output_tokens': model_totals[1],
+            'total_cost': model_totals[2]
+        }
+        for model_name, model_totals in totals.items()
+    }
     
     return {
-        'call_duration_secs': metadata.get('call_duration_secs', 0),
-        'call_duration_formatted': format_duration(metadata.get('call_duration_secs', 0)),
-        'start_time': datetime.fromtimestamp(metadata.get('start_time_unix_secs', 0)).isoformat() if metadata.get('start_time_unix_secs') else None,
-        'termination_reason': metadata.get('termination_reason', 'Unknown'),
-        'main_language': metadata.get('main_language', 'Unknown'),
+        'call_duration_secs': duration_secs,
+        'call_duration_formatted': format_duration(int(duration_secs)),
+        'start_time': _iso_from_unix(int(start_time_unix)) if start_time_unix else None,
+        'termination_reason': mget('termination_reason', _UNKNOWN_T),
+        'main_language': mget('main_language', _UNKNOWN_T),
         'costs': {
             'total_cost_dollars': round(total_cost_dollars, 4),
             'call_cost_dollars': round(call_cost_dollars, 4),
             'llm_cost_dollars': round(llm_cost_dollars, 4),
-            'total_cost_credits': metadata.get('cost', 0),
-            'call_cost_credits': charging.get('call_charge', 0),
-            'llm_cost_credits': charging.get('llm_charge', 0)
+            'total_cost_credits': cost_credits,
+            'call_cost_credits': call_charge_credits,
+            'llm_cost_credits': llm_charge_credits
         },
         'llm_usage': llm_details,
-        'features_used': extract_features_used(metadata.get('features_usage', {}))
+        'features_used': extract_features_used(mget('features_usage', {}))
     }
 
 def extract_analysis_data(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -102,90 +197,129 @@ def extract_analysis_data(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         Dict containing analysis results
     """
-    data = webhook_data.get('data', {})
+    return _extract_analysis(webhook_data.get('data') or _EMPTY)
+
+def _extract_analysis(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Analysis extraction over the already-resolved 'data' dict"""
     analysis = data.get('analysis', {})
     
     # Extract data collection results
     collected_data = {}
     data_collection = analysis.get('data_collection_results', {})
-    
+
     for key, item in data_collection.items():
+        # Resolve json_schema once per item instead of re-fetching it (and
+        # allocating a {} default) for every field pulled out of it
+        js = item.get('json_schema') or _EMPTY
         collected_data[key] = {
             'value': item.get('value'),
-            'type': item.get('json_schema', {}).get('type', 'unknown'),
-            'description': item.get('json_schema', {}).get('description', ''),
+            'type': js.get('type', _UNKNOWN),
+            'description': js.get('description', ''),
             'rationale': item.get('rationale', '')
         }
     
     return {
         'summary': analysis.get('transcript_summary', ''),
-        'call_successful': analysis.get('call_successful', 'unknown'),
+        'call_successful': analysis.get('call_successful', _UNKNOWN),
         'collected_data': collected_data,
         'evaluation_results': analysis.get('evaluation_criteria_results', {})
     }
 
+# Memoized: durations repeat heavily across transcript rows and the int
+# domain is bounded by call length, so hits approach 100% on a typical call
+@lru_cache(maxsize=4096)
 def format_duration(seconds: int) -> str:
     """Format duration from seconds to human readable format"""
-    if seconds < 60:
-        return f"{seconds} seconds"
-    elif seconds < 3600:
-        minutes = seconds // 60
-        secs = seconds % 60
-        return f"{minutes}m {secs}s"
-    else:
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        secs = seconds % 60
-        return f"{hours}h {minutes}m {secs}s"
+    # Single divmod chain with a tuple-indexed format instead of three
+    # separate arithmetic branches
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    bucket = (seconds >= 60) + (seconds >= 3600)
+    return (
+        "%d seconds" % secs,
+        "%dm %ds" % (minutes, secs),
+        "%dh %dm %ds" % (hours, minutes, secs)
+    )[bucket]
+
+@lru_cache(maxsize=256)
+def _pretty_feature(name: str) -> str:
+    """Title-case a feature name; memoized since the vocabulary is a small
+    fixed set defined by ElevenLabs"""
+    return name.replace('_', ' ').title()
 
 def extract_features_used(features_usage: Dict[str, Any]) -> List[str]:
     """Extract list of features that were actually used"""
-    used_features = []
-    
-    for feature, details in features_usage.items():
-        if isinstance(details, dict) and details.get('used'):
-            used_features.append(feature.replace('_', ' ').title())
-        elif isinstance(details, bool) and details:
-            used_features.append(feature.replace('_', ' ').title())
-    
-    return used_features
+    return [
+        _pretty_feature(feature)
+        for feature, details in features_usage.items()
+        # type(...) is dict is an identity check, skipping isinstance's
+        # subclass walk; webhook payloads never carry dict subclasses
+        if details is True or (type(details) is dict and details.get('used'))
+    ]
+
+def decode_webhook(raw: bytes) -> Dict[str, Any]:
+    """
+    Decode a raw webhook body into the dict shape the extractors expect
+
+    Kept next to the extractors so the ingress and the processing agree on
+    one decoder (orjson parses the large post_call_transcription payloads
+    several times faster than stdlib json).
+    """
+    return orjson.loads(raw)
+
+def _extract_all(webhook_data: Dict[str, Any], include_raw: Optional[bool] = None) -> tuple:
+    """Resolve the 'data' dict once and run all three extractors over it,
+    instead of each public extractor re-fetching it per call"""
+    data = webhook_data.get('data') or _EMPTY
+    return (
+        _extract_transcript(data, include_raw),
+        _extract_statistics(data),
+        _extract_analysis(data)
+    )
 
-def process_post_call_webhook(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+def process_post_call_webhook(webhook_data: Dict[str, Any], include_raw: Optional[bool] = None) -> Dict[str, Any]:
     """
     Process post-call transcription webhook and extract all relevant data
-    
+
     Returns:
         Dict containing all processed data ready for UI display
     """
     webhook_type = webhook_data.get('type', '')
-    
+
     if webhook_type != 'post_call_transcription':
         return {
             'error': f'Unexpected webhook type: {webhook_type}',
             'raw_data': webhook_data
         }
-    
-    try:
-        transcript_data = extract_transcript_data(webhook_data)
-        statistics = extract_call_statistics(webhook_data)
-        analysis = extract_analysis_data(webhook_data)
-        
-        return {
-            'webhook_type': webhook_type,
-            'timestamp': datetime.now().isoformat(),
-            'conversation_id': transcript_data.get('conversation_id'),
-            'agent_id': transcript_data.get('agent_id'),
-            'transcript': transcript_data,
-            'statistics': statistics,
-            'analysis': analysis,
-            'raw_data': webhook_data  # Include raw data for debugging
-        }
-    except Exception as e:
+
+    # Reject malformed payloads before any extraction work
+    if not isinstance(webhook_data.get('data'), dict):
         return {
-            'error': f'Error processing webhook: {str(e)}',
+            'error': 'Missing data payload',
             'raw_data': webhook_data
         }
 
+    # The extractors already return safely on missing subkeys, so there is
+    # no blanket try/except here: it cost a stringified traceback on every
+    # failure and hid real bugs as data
+    transcript_data, statistics, analysis = _extract_all(webhook_data, include_raw=include_raw)
+
+    # Stays a dict rather than a slotted dataclass: callers add keys to it
+    # (classified_transcript, live_transcript) and it round-trips through
+    # Redis/orjson as-is, per the module docstring
+    result = {
+        'webhook_type': webhook_type,
+        'timestamp': _now().isoformat(),
+        'conversation_id': transcript_data['conversation_id'],
+        'agent_id': transcript_data['agent_id'],
+        'transcript': transcript_data,
+        'statistics': statistics,
+        'analysis': analysis
+    }
+    if include_raw or (include_raw is None and _INCLUDE_RAW_DEFAULT):
+        result['raw_data'] = webhook_data  # Include raw data for debugging
+    return result
+
 def get_formatted_transcript_text(transcript_data: List[Dict[str, Any]]) -> str:
     """
     Convert transcript data to formatted text
@@ -193,28 +327,35 @@ def get_formatted_transcript_text(transcript_data: List[Dict[str, Any]]) -> str:
     Returns:
         Formatted transcript as text string
     """
-    lines = []
-    for entry in transcript_data:
-        time = format_duration(entry.get('time_in_call_secs', 0))
-        role = entry.get('role', 'unknown').upper()
-        message = entry.get('message', '')
-        
-        if message:
-            lines.append(f"[{time}] {role}: {message}")
-    
-    return "\n\n".join(lines)
+    # Generator fed straight to join: no intermediate list, and join sizes
+    # its buffer once. The walrus keeps the message lookup to a single .get
+    # while still skipping empty rows before any formatting work.
+    return "\n\n".join(
+        f"[{format_duration(int(entry.get('time_in_call_secs', 0)))}] "
+        f"{entry.get('role', _UNKNOWN).upper()}: {message}"
+        for entry in transcript_data
+        if (message := entry.get('message'))
+    )
+
+# Output key -> (collected_data key, default when absent)
+_PATIENT_FIELDS = {
+    'patient_name': ('patient_name', _UNKNOWN_T),
+    'patient_dob': ('patient_dob', _UNKNOWN_T),
+    'primary_diagnosis': ('primary_diagnosis', _UNKNOWN_T),
+    'comorbidities': ('comorbidities', _NONE),
+    'transportation_needed': ('transportation_assistance', False)
+}
 
 def extract_key_patient_info(collected_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Extract key patient information for quick reference
-    
+
     Returns:
         Dict with key patient details
     """
+    # `or _EMPTY` reuses one shared dict instead of allocating a fresh {}
+    # default for every missing field
     return {
-        'patient_name': collected_data.get('patient_name', {}).get('value', 'Unknown'),
-        'patient_dob': collected_data.get('patient_dob', {}).get('value', 'Unknown'),
-        'primary_diagnosis': collected_data.get('primary_diagnosis', {}).get('value', 'Unknown'),
-        'comorbidities': collected_data.get('comorbidities', {}).get('value', 'None'),
-        'transportation_needed': collected_data.get('transportation_assistance', {}).get('value', False)
+        out_key: (collected_data.get(in_key) or _EMPTY).get('value', default)
+        for out_key, (in_key, default) in _PATIENT_FIELDS.items()
     }
\ No newline at end of file